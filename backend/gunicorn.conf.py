@@ -0,0 +1,32 @@
+'''
+gunicorn configuration
+    loaded automatically when gunicorn is started
+    from the backend directory:
+        gunicorn src.api:app
+    the gevent worker monkey patches the standard
+    library, which does not reach the C database drivers.
+    On PostgreSQL post_fork installs the psycogreen wait
+    callback so psycopg2 queries yield to other requests,
+    sqlite queries still block the whole worker
+    the drinks cache is per process unless CACHE_REDIS_URL
+    points to a shared redis, so without it a single worker
+    is started to keep cache invalidation consistent
+    each request holds at most one DataBase connection, so
+    worker_connections matches the connection pool size and
+    no request waits on the pool
+'''
+import os
+import multiprocessing
+
+from src.database.pool import pool_connections
+
+bind = '0.0.0.0:5000'
+worker_class = 'gevent'
+workers = multiprocessing.cpu_count() if os.getenv('CACHE_REDIS_URL') else 1
+worker_connections = pool_connections
+
+
+def post_fork(server, worker):
+    if os.getenv('DATABASE_URL', '').startswith('postgres'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
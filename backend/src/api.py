@@ -1,15 +1,53 @@
 import os
+import hashlib
+from operator import itemgetter
+from functools import wraps
 from flask import Flask, request, jsonify, abort
+from flask.json import JSONEncoder
 from sqlalchemy import exc
-import json
+from sqlalchemy.ext import baked
+import orjson
+import fastjsonschema
 from flask_cors import CORS
+from flask_caching import Cache
+from flask_compress import Compress
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, db, Drink, \
+    drink_columns, short_format, long_format
 from .auth.auth import AuthError, requires_auth
 
+
+# JSON Encoder
+'''
+ORJSONEncoder
+    Serializes the jsonify responses with orjson
+    instead of the standard library json module.
+    Types orjson can't handle natively fall back
+    to the default flask encoder.
+'''
+
+
+class ORJSONEncoder(JSONEncoder):
+    def encode(self, o):
+        option = orjson.OPT_SORT_KEYS if self.sort_keys else 0
+        return orjson.dumps(o, default=self.default, option=option).decode()
+
+
 app = Flask(__name__)
+app.json_encoder = ORJSONEncoder
 setup_db(app)
 CORS(app)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+# SimpleCache lives inside one process, set CACHE_REDIS_URL
+# to share the cache between several gunicorn workers
+cache_redis_url = os.getenv('CACHE_REDIS_URL')
+cache = Cache(app, config={
+    'CACHE_TYPE': 'RedisCache' if cache_redis_url else 'SimpleCache',
+    'CACHE_REDIS_URL': cache_redis_url,
+    'CACHE_DEFAULT_TIMEOUT': 60
+})
 
 # db_drop_and_create_all()
 
@@ -20,39 +58,212 @@ CORS(app)
     get_recipe
 
     Inputs:
-        - body: The JSON body of the request
+        - recipe_body: The recipe item of the request body,
+                       a single component or a list of them
     Outputs:
         - recipe: A list of dictionaries describing
                   each component of the recipe.
     Description:
         A private helper method used in post and 
         patch routes to format the recipe item of the
-        object before submitting in the DataBase
+        object before submitting in the DataBase.
+        The recipe must already be validated by
+        validate_body.
+'''
+
+
+RECIPE_KEYS = ('color', 'name', 'parts')
+get_recipe_values = itemgetter(*RECIPE_KEYS)
+
+
+def get_recipe(recipe_body):
+    if isinstance(recipe_body, dict):
+        recipe_body = [recipe_body]
+    return [dict(zip(RECIPE_KEYS, get_recipe_values(element)))
+            for element in recipe_body]
+
+
+# 2. clear_drinks_cache
+'''
+    clear_drinks_cache
+
+    Description:
+        A private helper method used in post, patch
+        and delete routes to invalidate the cached
+        responses of the GET drinks routes after
+        the DataBase has been modified
+'''
+
+
+def clear_drinks_cache():
+    cache.delete('drinks_short')
+    cache.delete('drinks_long')
+
+
+# 3. read_body
+'''
+    read_body
+
+    Outputs:
+        - body: The parsed JSON body of the request
+    Description:
+        A private helper method used in post and
+        patch routes to parse the request body with
+        orjson. Requests declaring a body larger than
+        MAX_BODY_SIZE are rejected before the body is read,
+        bodies without a declared length are read up to
+        MAX_BODY_SIZE and rejected past it.
+    Errors expected:
+        - Status code 400, 422
+'''
+
+
+MAX_BODY_SIZE = 64 * 1024
+
+
+def read_body():
+    if (request.content_length or 0) > MAX_BODY_SIZE:
+        abort(422)
+    # chunked requests carry no Content-Length, read at most one
+    # byte past the limit to detect oversized bodies
+    data = request.stream.read(MAX_BODY_SIZE + 1)
+    if len(data) > MAX_BODY_SIZE:
+        abort(422)
+    try:
+        body = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        abort(400)
+    if not isinstance(body, dict):
+        abort(400)
+    return body
+
+
+# 4. drinks_response / conditional
+'''
+    drinks_response
+
+    Inputs:
+        - drinks_formated: The formatted drinks
+    Outputs:
+        - response: The GET drinks response carrying an ETag
+    Description:
+        A private helper that encodes the response body
+        straight to bytes with orjson, skipping the
+        intermediate string built by jsonify, and tags
+        the response with a short hash of the body.
+        It runs only when the response is built, the
+        ETag is then cached along with the response.
+
+    conditional
+
+    Description:
+        A decorator applied to the GET drinks routes
+        above the cache. It answers 304 Not Modified with
+        an empty body when the client's If-None-Match
+        header matches the ETag of the response, or the
+        "<etag>:<algorithm>" form Flask-Compress gives
+        the ETag of compressed responses.
+'''
+
+
+def drinks_response(drinks_formated):
+    body = orjson.dumps({
+        "success": True,
+        "drinks": drinks_formated,
+    })
+    response = app.response_class(
+        body, mimetype=app.config['JSONIFY_MIMETYPE'])
+    response.set_etag(hashlib.blake2b(body, digest_size=8).hexdigest())
+    return response
+
+
+def conditional(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        response = f(*args, **kwargs)
+        etag, _ = response.get_etag()
+        if etag is not None:
+            for algorithm in app.config['COMPRESS_ALGORITHM']:
+                compressed_etag = '{}:{}'.format(etag, algorithm)
+                if compressed_etag in request.if_none_match:
+                    response.set_etag(compressed_etag)
+                    break
+        return response.make_conditional(request)
+    return wrapper
+
+
+# 5. drinks_query
+'''
+    drinks_query
+
+    Description:
+        A baked query selecting the columns of all drinks
+        ordered by id, used by the GET drinks routes.
+        The query is built and compiled to SQL once, later
+        calls reuse the cached statement.
+'''
+
+
+bakery = baked.bakery()
+drinks_query = bakery(
+    lambda session: session.query(*drink_columns).order_by(Drink.id))
+
+
+# 6. validate_body
+'''
+    validate_body
+
+    Inputs:
+        - validate: One of the compiled validators below
+        - body: The JSON body of the request
+    Description:
+        A private helper method used in post and
+        patch routes to check the shape of the body.
+        The JSON schemas are compiled to validator
+        functions once, when the module is imported.
     Errors expected:
         - Status code 422
 '''
 
 
-def get_recipe(body):
-    recipe = []
-    recipe_body = body['recipe']
-    recipe_type = type(recipe_body)
-    if recipe_type == list:
-        for element in recipe_body:
-            recipe.append({
-                'color': element['color'],
-                'name': element['name'],
-                'parts': element['parts']
-            })
-    elif recipe_type == dict:
-        recipe.append({
-            'color': recipe_body['color'],
-            'name': recipe_body['name'],
-            'parts': recipe_body['parts']
-        })
-    else:
+RECIPE_ITEM_SCHEMA = {
+    'type': 'object',
+    'required': list(RECIPE_KEYS),
+}
+DRINK_PROPERTIES = {
+    'title': {'type': 'string'},
+    'recipe': {
+        'oneOf': [
+            RECIPE_ITEM_SCHEMA,
+            {'type': 'array', 'items': RECIPE_ITEM_SCHEMA},
+        ]
+    },
+}
+DRINK_SCHEMA = {
+    'type': 'object',
+    'required': ['title', 'recipe'],
+    'properties': DRINK_PROPERTIES,
+}
+
+validate_drink = fastjsonschema.compile(DRINK_SCHEMA)
+validate_drink_patch = fastjsonschema.compile({
+    'type': 'object',
+    'anyOf': [{'required': ['title']}, {'required': ['recipe']}],
+    'properties': DRINK_PROPERTIES,
+})
+validate_drinks_bulk = fastjsonschema.compile({
+    'type': 'object',
+    'properties': {
+        'drinks': {'type': 'array', 'items': DRINK_SCHEMA},
+    },
+})
+
+
+def validate_body(validate, body):
+    try:
+        validate(body)
+    except fastjsonschema.JsonSchemaException:
         abort(422)
-    return recipe
 
 
 # ROUTES
@@ -71,24 +282,25 @@ def get_recipe(body):
                 "success" : True,
                 "drinks"  : drinks_formated,
             }
+        - Status code 304 with an empty body when the
+          If-None-Match header matches the response ETag
         - In case of failure expect status code 404
 '''
 
 
 @app.route('/drinks', methods=['GET'])
+@conditional
+@cache.cached(key_prefix='drinks_short')
 def get_drinks():
     # Query all drinks stored in Database
-    drinks = Drink.query.order_by(Drink.id).all()
+    drinks = drinks_query(db.session()).all()
     # Check if query result is empty
     if len(drinks) == 0:
         abort(404)
     # format drinks to short format
-    drinks_formated = [drink.short() for drink in drinks]
+    drinks_formated = [short_format(drink) for drink in drinks]
     # format json response
-    return jsonify({
-        "success": True,
-        "drinks": drinks_formated,
-    })
+    return drinks_response(drinks_formated)
 
 
 # 2. GET Drinks-detail
@@ -109,25 +321,26 @@ def get_drinks():
                 "success" : True,
                 "drinks"  : drinks_formated,
             }
+        - Status code 304 with an empty body when the
+          If-None-Match header matches the response ETag
         - In case of failure expect status code 404
 '''
 
 
 @app.route('/drinks-detail', methods=['GET'])
 @requires_auth(permission='get:drinks-detail')
+@conditional
+@cache.cached(key_prefix='drinks_long')
 def drink_recipe(jwt):
     # Query all drinks stored in Database
-    drinks = Drink.query.order_by(Drink.id).all()
+    drinks = drinks_query(db.session()).all()
     # Check if query result is empty
     if len(drinks) == 0:
         abort(404)
     # format drinks to long format
-    drinks_formated = [drink.long() for drink in drinks]
+    drinks_formated = [long_format(drink) for drink in drinks]
     # format json response
-    return jsonify({
-        "success": True,
-        "drinks": drinks_formated,
-    })
+    return drinks_response(drinks_formated)
 
 
 # 3. POST Drinks
@@ -153,29 +366,92 @@ def drink_recipe(jwt):
 '''
 
 
+REQUIRED_KEYS = frozenset(('title', 'recipe'))
+
+
 @app.route("/drinks", methods=['POST'])
 @requires_auth(permission='post:drinks')
 def create_drink(jwt):
     # read the json data form body request
-    body = request.get_json()
+    body = read_body()
     # check all parts are available
-    if not('title' in body and 'recipe' in body):
+    if not REQUIRED_KEYS <= body.keys():
         abort(400)
+    validate_body(validate_drink, body)
+    title, recipe_body = body['title'], body['recipe']
     # read data and commit
     try:
-        title = body['title']
-        recipe = get_recipe(body)
-        drink = Drink(title=title, recipe=json.dumps(recipe))
+        recipe = get_recipe(recipe_body)
+        drink = Drink(title=title, recipe=recipe)
         drink.insert()
-        return jsonify({
-            'success': True,
-            'drinks': [drink.long()]
-        })
-    except:
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        abort(422)
+    clear_drinks_cache()
+    return jsonify({
+        'success': True,
+        'drinks': [drink.long()]
+    })
+
+
+# 4. POST Drinks bulk
+'''
+    POST /drinks/bulk
+
+    Description:
+        A private endpoint that requires
+        the 'post:drinks' permission.
+        It calls the method create_drinks.
+        Method create_drinks expects a body of the form
+        {"drinks": [{"title": ..., "recipe": ...}, ...]},
+        validates every drink and commits all of them
+        to the DataBase in a single transaction.
+        The method returns the newly created drinks
+        in the long format.
+    Output:
+        - Status code : 200
+        - json response :
+            {
+                "success" : True,
+                "drinks"  : drinks_formated,
+            }
+        - In case of failure expect status code 400,422
+'''
+
+
+@app.route("/drinks/bulk", methods=['POST'])
+@requires_auth(permission='post:drinks')
+def create_drinks(jwt):
+    # read the json data form body request
+    body = read_body()
+    drinks_body = body.get('drinks')
+    # check a list of drinks is available
+    if not isinstance(drinks_body, list) or len(drinks_body) == 0:
+        abort(400)
+    validate_body(validate_drinks_bulk, body)
+    # read data and commit once for the whole batch
+    try:
+        drinks = [
+            Drink(title=element['title'],
+                  recipe=get_recipe(element['recipe']))
+            for element in drinks_body
+        ]
+        db.session.add_all(drinks)
+        # flush to get the ids, format before the commit expires them
+        db.session.flush()
+        drinks_formated = [drink.long() for drink in drinks]
+        db.session.commit()
+    except exc.SQLAlchemyError:
+        db.session.rollback()
         abort(422)
+    clear_drinks_cache()
+    return jsonify({
+        'success': True,
+        'drinks': drinks_formated
+    })
 
 
-# 3. PATCH Drinks
+# 5. PATCH Drinks
 '''
     PATCH /drinks/<id>
 
@@ -204,30 +480,33 @@ def create_drink(jwt):
 @requires_auth(permission='patch:drinks')
 def edit_drink(jwt, drink_id):
     # query for drink
-    drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
+    drink = Drink.query.get(drink_id)
     # check if drink found
     if drink is None:
         abort(404)
     # read request body
-    body = request.get_json()
+    body = read_body()
     # check body data
-    if ('title' in body or 'recipe' in body):
-        if 'title' in body:
-            drink.title = body['title']
-        if 'recipe' in body:
-            recipe = get_recipe(body)
-            drink.recipe = json.dumps(recipe)
-    else:
-        abort(422)
+    validate_body(validate_drink_patch, body)
+    if 'title' in body:
+        drink.title = body['title']
+    if 'recipe' in body:
+        recipe = get_recipe(body['recipe'])
+        drink.recipe = recipe
     # commit to database
-    drink.update()
+    try:
+        drink.update()
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        abort(422)
+    clear_drinks_cache()
     return jsonify({
         'success': True,
         'drinks': [drink.long()]
     })
 
 
-# 5. DELETE Drink
+# 6. DELETE Drink
 '''
     DELETE /drinks/<id>
 
@@ -255,12 +534,13 @@ def edit_drink(jwt, drink_id):
 @requires_auth(permission='delete:drinks')
 def remove_drink(jwt, drink_id):
     # query for drink
-    drink = Drink.query.filter(Drink.id == drink_id).one_or_none()
+    drink = Drink.query.get(drink_id)
     # check if drink found
     if drink is None:
         abort(404)
     # delete drink
     drink.delete()
+    clear_drinks_cache()
     return jsonify({
         'success': True,
         'delete': drink_id
@@ -1,14 +1,26 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON
 from flask_sqlalchemy import SQLAlchemy
-import json
+import orjson
+
+from .pool import pool_options
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+database_path = os.getenv(
+    "DATABASE_URL",
+    "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
+'''
+json_serializer(value)
+    encodes JSON columns with orjson, the engine
+    expects the serialized value as a string
+'''
+def json_serializer(value):
+    return orjson.dumps(value).decode()
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
@@ -16,6 +28,15 @@ setup_db(app)
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    engine_options = {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "json_serializer": json_serializer,
+        "json_deserializer": orjson.loads,
+    }
+    if not database_path.startswith("sqlite"):
+        engine_options.update(pool_options)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
     db.app = app
     db.init_app(app)
 
@@ -29,6 +50,31 @@ def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
 
+'''
+short_format(drink) / long_format(drink)
+    short and long form representations of a drink
+    accept a Drink instance or a query row with
+    id, title and recipe columns, so list endpoints
+    can skip building full ORM objects
+    EXAMPLE
+        rows = Drink.query.with_entities(*drink_columns).all()
+        drinks = [short_format(row) for row in rows]
+'''
+def short_format(drink):
+    short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in drink.recipe]
+    return {
+        'id': drink.id,
+        'title': drink.title,
+        'recipe': short_recipe
+    }
+
+def long_format(drink):
+    return {
+        'id': drink.id,
+        'title': drink.title,
+        'recipe': drink.recipe
+    }
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -38,33 +84,23 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients blob - this stores a json column
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    recipe =  Column(JSON, nullable=False)
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        return short_format(self)
 
     '''
     long()
         long form representation of the Drink model
     '''
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        return long_format(self)
 
     '''
     insert()
@@ -96,7 +132,7 @@ class Drink(db.Model):
         updates a new model into a database
         the model must exist in the database
         EXAMPLE
-            drink = Drink.query.filter(Drink.id == id).one_or_none()
+            drink = Drink.query.get(id)
             drink.title = 'Black Coffee'
             drink.update()
     '''
@@ -104,4 +140,10 @@ class Drink(db.Model):
         db.session.commit()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return orjson.dumps(self.short()).decode()
+
+'''
+drink_columns
+    the columns needed by short_format and long_format
+'''
+drink_columns = (Drink.id, Drink.title, Drink.recipe)
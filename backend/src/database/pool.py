@@ -0,0 +1,18 @@
+'''
+pool_options
+    connection pool tuning, only the pooled (non sqlite file)
+    backends accept the sizing arguments
+    kept free of imports so gunicorn.conf.py can read it
+    without loading the app
+'''
+pool_options = {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_timeout": 30,
+}
+
+'''
+pool_connections
+    the most connections one process can hold at once
+'''
+pool_connections = pool_options["pool_size"] + pool_options["max_overflow"]
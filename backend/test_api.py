@@ -0,0 +1,99 @@
+import io
+import os
+import tempfile
+import unittest
+
+database_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///{}'.format(
+    os.path.join(database_dir, 'test.db'))
+
+from werkzeug.exceptions import UnprocessableEntity
+
+from src.api import app, clear_drinks_cache, read_body, MAX_BODY_SIZE
+from src.database.models import db, db_drop_and_create_all, Drink
+
+
+# a chunked request as gunicorn hands it over, without Content-Length
+chunked_environ = {
+    'CONTENT_LENGTH': '',
+    'HTTP_TRANSFER_ENCODING': 'chunked',
+    'wsgi.input_terminated': True,
+}
+
+
+class DrinksTestCase(unittest.TestCase):
+    """This class represents the coffee shop test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.client = app.test_client()
+        with app.app_context():
+            db_drop_and_create_all()
+            db.session.add_all([
+                Drink(title='drink {}'.format(i), recipe=[{
+                    'color': 'blue',
+                    'name': 'water',
+                    'parts': i
+                }])
+                for i in range(20)
+            ])
+            db.session.commit()
+        clear_drinks_cache()
+
+    def tearDown(self):
+        """Executed after each test"""
+        with app.app_context():
+            db.session.remove()
+
+    def test_get_drinks_revalidation_not_modified(self):
+        res = self.client.get('/drinks')
+        etag = res.headers['ETag']
+        res = self.client.get('/drinks', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+    def test_get_drinks_compressed_revalidation_not_modified(self):
+        for algorithm in ('br', 'gzip'):
+            headers = {'Accept-Encoding': algorithm}
+            res = self.client.get('/drinks', headers=headers)
+            etag = res.headers['ETag']
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.headers['Content-Encoding'], algorithm)
+            self.assertTrue(etag.endswith(':{}"'.format(algorithm)))
+
+            headers['If-None-Match'] = etag
+            res = self.client.get('/drinks', headers=headers)
+
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res.data, b'')
+
+    def test_get_drinks_stale_etag(self):
+        res = self.client.get('/drinks', headers={
+            'Accept-Encoding': 'gzip',
+            'If-None-Match': '"stale:gzip"'
+        })
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_read_body_chunked_too_large(self):
+        data = b'{"title": "' + b'x' * MAX_BODY_SIZE + b'"}'
+        with app.test_request_context(
+                '/drinks', method='POST',
+                input_stream=io.BytesIO(data),
+                environ_overrides=chunked_environ):
+            with self.assertRaises(UnprocessableEntity):
+                read_body()
+
+    def test_read_body_chunked(self):
+        with app.test_request_context(
+                '/drinks', method='POST',
+                input_stream=io.BytesIO(b'{"title": "water"}'),
+                environ_overrides=chunked_environ):
+            self.assertEqual(read_body(), {'title': 'water'})
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()